@@ -1,9 +1,12 @@
 from sqlmodel import Session, select
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 import logging
 
 from app.models import Chat, ChatMessage
+from app.schemas import ChatIn
+from app.personas_service import get_persona
+from app.settings_service import get_context_message_count
 
 logger = logging.getLogger(__name__)
 
@@ -123,3 +126,87 @@ def rename_chat(session: Session, chat_id: int, new_name: str) -> Optional[Chat]
     session.refresh(chat)
     logger.info(f"Renamed chat {chat_id} to: {new_name}")
     return chat
+
+
+def prepare_chat_turn(session: Session, payload: ChatIn) -> Tuple[Chat, Dict[str, Any]]:
+    """Resolve the chat for a turn and assemble the LM Studio payload.
+
+    Raises LookupError if the persona or chat does not exist.
+    """
+    # Get persona if specified
+    persona = None
+    if payload.persona_id:
+        persona = get_persona(session, payload.persona_id)
+        if not persona:
+            raise LookupError("Persona not found")
+
+    # Handle chat creation or retrieval
+    chat = None
+    if payload.chat_id:
+        chat = get_chat(session, payload.chat_id)
+        if not chat:
+            raise LookupError("Chat not found")
+    else:
+        # Create new chat
+        chat_name = generate_chat_name_from_prompt(payload.prompt)
+        chat = create_chat(session, chat_name)
+
+    # Get context messages if continuing an existing chat
+    context_count = get_context_message_count(session)
+    context_messages = []
+    if payload.chat_id and context_count > 0:
+        context_messages = get_recent_messages_for_context(session, chat.id, context_count)
+
+    # Prepare the chat payload with system message first
+    messages = []
+
+    # Always include system message first if persona is specified
+    if persona:
+        messages.append({"role": "system", "content": persona.system_prompt})
+
+    # Add context messages (user and assistant turns)
+    for msg in context_messages:
+        messages.append({"role": msg.role, "content": msg.content})
+
+    # Add current user message
+    messages.append({"role": "user", "content": payload.prompt})
+
+    chat_payload = {
+        "model": payload.model,
+        "messages": messages,
+        "temperature": payload.temperature,
+        "max_tokens": payload.max_tokens,
+    }
+    return chat, chat_payload
+
+
+def save_chat_turn(session: Session, chat_id: int, prompt: str, content: str) -> List[ChatMessage]:
+    """Persist the user prompt and assistant reply for a completed turn"""
+    # Log the prompt length and first/last 100 chars for debugging
+    prompt_preview = prompt[:100] + "..." if len(prompt) > 200 else prompt
+    logger.info(f"Saving user message to database - Length: {len(prompt)}, Preview: {prompt_preview}")
+    return [
+        add_message(session, chat_id, "user", prompt),
+        add_message(session, chat_id, "assistant", content),
+    ]
+
+
+def message_to_dict(message: ChatMessage) -> Dict[str, Any]:
+    """Convert a message to ChatMessageOut format"""
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "created_at": message.created_at,
+    }
+
+
+def chat_to_dict(chat: Chat, messages: Optional[List[ChatMessage]] = None) -> Dict[str, Any]:
+    """Convert a chat and optionally its messages to ChatOut format"""
+    return {
+        "id": chat.id,
+        "name": chat.name,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "messages": [message_to_dict(msg) for msg in messages or []],
+    }
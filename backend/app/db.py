@@ -1,19 +1,119 @@
 from sqlmodel import SQLModel, create_engine
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, make_url
+from contextlib import contextmanager
 from pathlib import Path
 import os
+import sys
 
-DB_PATH = Path("/app/data/app.db")
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-# Ensure the directory is writable
-os.chmod(DB_PATH.parent, 0o755)
-engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+DATA_DIR = Path(os.getenv("DATA_DIR", "/app/data"))
+DB_PATH = DATA_DIR / "app.db"
+# Any SQLAlchemy URL, e.g. postgresql+psycopg2://user:pass@db:5432/openllmweb
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DB_PATH}"
+
+# Connection pool tuning (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes init_db
+INIT_LOCK_KEY = 0x4F4C5757
+
+
+def create_db_engine(url: str) -> Engine:
+    """Create an engine for the given URL with dialect-appropriate settings"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+# Engines connect lazily, so creating one here does not touch the filesystem
+engine = create_db_engine(DATABASE_URL)
+
+
+def _local_dir() -> Path:
+    """Directory holding the SQLite file (if any) and the init lock file"""
+    database = engine.url.database
+    if engine.url.get_backend_name() == "sqlite" and database and database != ":memory:":
+        return Path(database).parent
+    return DATA_DIR
+
+
+@contextmanager
+def _init_lock():
+    """Hold a lock shared by every worker process while the schema is created.
+
+    SQLite uses a lock file next to the database; PostgreSQL uses an advisory
+    lock so that workers on different hosts are serialized too.
+    """
+    if engine.url.get_backend_name() == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INIT_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INIT_LOCK_KEY})
+        return
+
+    with open(_local_dir() / ".init.lock", "a+") as lock_file:
+        if sys.platform == "win32":
+            import msvcrt
+
+            lock_file.seek(0)
+            while True:
+                try:
+                    # Blocks for up to ~10 s per attempt before raising
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_data_dir():
+    """Create the data directory used by SQLite and the init lock"""
+    db_dir = _local_dir()
+    db_dir.mkdir(parents=True, exist_ok=True)
+    # Ensure the directory is writable
+    os.chmod(db_dir, 0o755)
 
 
 def init_db():
+    # Register the table models on SQLModel.metadata before creating them
+    import app.models  # noqa: F401
+
     try:
-        SQLModel.metadata.create_all(engine)
-        print(f"Database initialized successfully at {DB_PATH}")
+        if engine.url.get_backend_name() != "postgresql":
+            ensure_data_dir()
+        with _init_lock():
+            SQLModel.metadata.create_all(engine)
+            # create_all skips existing tables, so add indexes introduced since
+            # the table was first created
+            for table in SQLModel.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
+        print(f"Database initialized successfully at {engine.url.render_as_string(hide_password=True)}")
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
-
@@ -1,20 +1,130 @@
 import httpx
-from typing import Dict, Any
+import json
+import os
+from typing import AsyncIterator, Dict, Any, Optional
+
+from app.resilience import CircuitBreaker, CircuitOpenError, retry_with_jitter
+
+CONNECT_TIMEOUT = float(os.getenv("LMSTUDIO_CONNECT_TIMEOUT", "5"))
+# Read timeout for metadata calls such as /models
+READ_TIMEOUT = float(os.getenv("LMSTUDIO_READ_TIMEOUT", "30"))
+# Chat read timeout = base + per-token allowance * max_tokens, capped
+CHAT_READ_TIMEOUT_BASE = float(os.getenv("LMSTUDIO_CHAT_READ_TIMEOUT_BASE", "30"))
+CHAT_READ_TIMEOUT_PER_TOKEN = float(os.getenv("LMSTUDIO_CHAT_READ_TIMEOUT_PER_TOKEN", "0.2"))
+CHAT_READ_TIMEOUT_MAX = float(os.getenv("LMSTUDIO_CHAT_READ_TIMEOUT_MAX", "600"))
+DEFAULT_MAX_TOKENS = 512
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LMSTUDIO_BREAKER_FAILURES", "5"))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv("LMSTUDIO_BREAKER_RECOVERY", "30"))
+MODELS_RETRY_ATTEMPTS = int(os.getenv("LMSTUDIO_MODELS_RETRIES", "3"))
+# Read timeout for the /models probe sent when the breaker is half-open
+PROBE_READ_TIMEOUT = float(os.getenv("LMSTUDIO_PROBE_READ_TIMEOUT", "5"))
+
+# One breaker per LM Studio URL, shared by every client instance in the process
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def _probe(base_url: str):
+    async def probe() -> None:
+        timeout = httpx.Timeout(PROBE_READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.get(f"{base_url}/models")
+            r.raise_for_status()
+
+    return probe
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    base_url = base_url.rstrip("/")
+    breaker = _breakers.get(base_url)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            base_url,
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=BREAKER_RECOVERY_TIMEOUT,
+            # Probe with the cheap /models call so a long completion cannot
+            # hold the half-open slot
+            probe=_probe(base_url),
+        )
+        _breakers[base_url] = breaker
+    return breaker
+
+
+def chat_read_timeout(max_tokens: Optional[int]) -> float:
+    tokens = max_tokens if max_tokens and max_tokens > 0 else DEFAULT_MAX_TOKENS
+    return min(CHAT_READ_TIMEOUT_BASE + CHAT_READ_TIMEOUT_PER_TOKEN * tokens, CHAT_READ_TIMEOUT_MAX)
 
 
 class LMStudioClient:
     def __init__(self, base_url: str):
         self.base_url = base_url.rstrip("/")
+        self.breaker = get_breaker(self.base_url)
 
     async def list_models(self) -> Dict[str, Any]:
-        async with httpx.AsyncClient(timeout=30) as client:
-            r = await client.get(f"{self.base_url}/models")
-            r.raise_for_status()
-            return r.json()
+        timeout = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+        async def request():
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                r = await client.get(f"{self.base_url}/models")
+                r.raise_for_status()
+                return r.json()
+
+        # Listing models is idempotent, so transient failures are retried; the
+        # retries run inside one breaker call so they count as a single failure
+        return await self.breaker.call(
+            lambda: retry_with_jitter(request, attempts=MODELS_RETRY_ATTEMPTS)
+        )
 
     async def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        async with httpx.AsyncClient(timeout=120) as client:
+        timeout = httpx.Timeout(
+            chat_read_timeout(payload.get("max_tokens")), connect=CONNECT_TIMEOUT
+        )
+
+        async def request():
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                r = await client.post(f"{self.base_url}/chat/completions", json=payload)
+                r.raise_for_status()
+                return r.json()
+
+        # Completions are not idempotent, so they are never retried
+        return await self.breaker.call(request)
+
+    async def load_model(self, payload: Dict[str, Any], read_timeout: float) -> Dict[str, Any]:
+        """Send a completion whose only purpose is to get the model loaded.
+
+        Loading a large model can take minutes, so this gets its own read
+        timeout and stays out of the breaker's failure count: a slow load is
+        not evidence that LM Studio is down. It still fails fast while the
+        breaker is open.
+        """
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            raise CircuitOpenError(self.base_url, max(self.breaker.snapshot()["retry_after"], 1.0))
+        timeout = httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT)
+        async with httpx.AsyncClient(timeout=timeout) as client:
             r = await client.post(f"{self.base_url}/chat/completions", json=payload)
             r.raise_for_status()
             return r.json()
 
+    async def chat_stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding content deltas as they arrive"""
+        timeout = httpx.Timeout(
+            chat_read_timeout(payload.get("max_tokens")), connect=CONNECT_TIMEOUT
+        )
+        async with self.breaker.guard():
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                async with client.stream(
+                    "POST", f"{self.base_url}/chat/completions", json={**payload, "stream": True}
+                ) as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices") or []
+                        if choices:
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                yield delta
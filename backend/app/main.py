@@ -1,7 +1,9 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
 from typing import List
+from contextlib import asynccontextmanager
 import asyncio
 import logging
 
@@ -15,27 +17,39 @@ from app.personas_service import (
     create_persona,
     update_persona,
     delete_persona,
-    get_persona,
 )
 from app.chat_service import (
-    create_chat,
     get_chat,
     list_chats,
     delete_chat,
     rename_chat,
-    add_message,
     get_chat_messages,
-    get_recent_messages_for_context,
-    generate_chat_name_from_prompt,
+    prepare_chat_turn,
+    save_chat_turn,
+    chat_to_dict,
 )
-from app.lmstudio_client import LMStudioClient
-
-app = FastAPI(title="OpenLLMWeb API", version="1.0.0")
+from app.transfer_service import iter_export_lines, import_ndjson, TransferError, ImportAbortedError
+from app.lmstudio_client import LMStudioClient, get_breaker
+from app.resilience import CircuitOpenError
+from app.warmup_service import model_warmup
+from app.ws_service import handle_websocket, broadcast_history
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker; init_db serializes workers with a cross-process lock
+    await asyncio.to_thread(init_db)
+    model_warmup.start()
+    yield
+    await model_warmup.stop()
+
+
+app = FastAPI(title="OpenLLMWeb API", version="1.0.0", lifespan=lifespan)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -53,9 +67,6 @@ async def log_requests(request: Request, call_next):
     logger.info(f"Response: {response.status_code}")
     return response
 
-# Initialize database
-init_db()
-
 
 @app.get("/api/healthz")
 async def health_check():
@@ -96,6 +107,8 @@ async def fetch_models(session: Session = Depends(get_session)):
         client = LMStudioClient(base_url)
         models = await client.list_models()
         return models
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=502,
@@ -113,6 +126,9 @@ async def refresh_models(session: Session = Depends(get_session)):
         models = await client.list_models()
         logger.info(f"Successfully fetched {len(models.get('data', []))} models")
         return {"message": "Models refreshed successfully", "models": models}
+    except CircuitOpenError as e:
+        logger.error(f"Failed to refresh models: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to refresh models: {str(e)}")
         raise HTTPException(
@@ -121,6 +137,30 @@ async def refresh_models(session: Session = Depends(get_session)):
         )
 
 
+@app.get("/api/models/status")
+async def models_status(session: Session = Depends(get_session)):
+    """Report which models are warming, recently used or idle in this process"""
+    base_url = get_lm_studio_base_url(session)
+    return model_warmup.list_status(base_url)
+
+
+@app.post("/api/models/{model_id:path}/warm", status_code=202)
+async def warm_model(model_id: str, session: Session = Depends(get_session)):
+    """Start loading a model in LM Studio so the first chat does not pay the load time"""
+    base_url = get_lm_studio_base_url(session)
+    # LM Studio may have unloaded the model since we last used it, so always
+    # warm; a warm-up already in flight is reused
+    model_warmup.warm(base_url, model_id)
+    return model_warmup.status(base_url, model_id)
+
+
+@app.get("/api/lmstudio/status")
+async def lmstudio_status(session: Session = Depends(get_session)):
+    """Get the circuit breaker state for the configured LM Studio URL"""
+    base_url = get_lm_studio_base_url(session)
+    return get_breaker(base_url).snapshot()
+
+
 @app.get("/api/personas", response_model=List[Persona])
 async def list_personas_endpoint(session: Session = Depends(get_session)):
     """List all personas"""
@@ -186,69 +226,29 @@ async def chat_endpoint(
         base_url = get_lm_studio_base_url(session)
         client = LMStudioClient(base_url)
         
-        # Get persona if specified
-        persona = None
-        if payload.persona_id:
-            persona = get_persona(session, payload.persona_id)
-            if not persona:
-                raise HTTPException(status_code=404, detail="Persona not found")
-        
-        # Handle chat creation or retrieval
-        chat = None
-        if payload.chat_id:
-            chat = get_chat(session, payload.chat_id)
-            if not chat:
-                raise HTTPException(status_code=404, detail="Chat not found")
-        else:
-            # Create new chat
-            chat_name = generate_chat_name_from_prompt(payload.prompt)
-            chat = create_chat(session, chat_name)
-        
-        # Get context messages if continuing an existing chat
-        context_count = get_context_message_count(session)
-        context_messages = []
-        if payload.chat_id and context_count > 0:
-            context_messages = get_recent_messages_for_context(session, chat.id, context_count)
-        
-        # Prepare the chat payload with system message first
-        messages = []
-        
-        # Always include system message first if persona is specified
-        if persona:
-            messages.append({"role": "system", "content": persona.system_prompt})
-        
-        # Add context messages (user and assistant turns)
-        for msg in context_messages:
-            messages.append({"role": msg.role, "content": msg.content})
-        
-        # Add current user message
-        messages.append({"role": "user", "content": payload.prompt})
-        
-        chat_payload = {
-            "model": payload.model,
-            "messages": messages,
-            "temperature": payload.temperature,
-            "max_tokens": payload.max_tokens,
-        }
+        try:
+            chat, chat_payload = prepare_chat_turn(session, payload)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
         
         response = await client.chat(chat_payload)
+        model_warmup.record_use(base_url, payload.model)
         
         # Extract the content from the response
         content = ""
         if "choices" in response and len(response["choices"]) > 0:
             content = response["choices"][0].get("message", {}).get("content", "")
         
-        # Save messages to database
-        # Log the prompt length and first/last 100 chars for debugging
-        prompt_preview = payload.prompt[:100] + "..." if len(payload.prompt) > 200 else payload.prompt
-        logger.info(f"Saving user message to database - Length: {len(payload.prompt)}, Preview: {prompt_preview}")
-        add_message(session, chat.id, "user", payload.prompt)
-        add_message(session, chat.id, "assistant", content)
+        # Save messages to database and notify WebSocket clients
+        messages = save_chat_turn(session, chat.id, payload.prompt, content)
+        broadcast_history(chat, messages)
         
         return ChatResponseOut(content=content, raw=response, chat_id=chat.id)
         
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -256,6 +256,12 @@ async def chat_endpoint(
         )
 
 
+@app.websocket("/api/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Multiplexed chat streams over one connection"""
+    await handle_websocket(websocket)
+
+
 @app.get("/api/chats", response_model=List[ChatOut])
 async def list_chats_endpoint(session: Session = Depends(get_session)):
     """List all chats"""
@@ -285,27 +291,9 @@ async def get_chat_endpoint(chat_id: int, session: Session = Depends(get_session
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        # Get all messages for this chat
+        # Return chat data with all its messages
         messages = get_chat_messages(session, chat_id)
-        
-        # Convert messages to ChatMessageOut format
-        message_outs = []
-        for msg in messages:
-            message_outs.append({
-                "id": msg.id,
-                "role": msg.role,
-                "content": msg.content,
-                "created_at": msg.created_at
-            })
-        
-        # Return chat data with messages
-        return {
-            "id": chat.id,
-            "name": chat.name,
-            "created_at": chat.created_at,
-            "updated_at": chat.updated_at,
-            "messages": message_outs
-        }
+        return chat_to_dict(chat, messages)
     except HTTPException:
         raise
     except Exception as e:
@@ -340,26 +328,9 @@ async def rename_chat_endpoint(
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        # Get all messages for this chat
+        # Return chat data with all its messages
         messages = get_chat_messages(session, chat_id)
-        
-        # Convert messages to ChatMessageOut format
-        message_outs = []
-        for msg in messages:
-            message_outs.append({
-                "id": msg.id,
-                "role": msg.role,
-                "content": msg.content,
-                "created_at": msg.created_at
-            })
-        
-        return {
-            "id": chat.id,
-            "name": chat.name,
-            "created_at": chat.created_at,
-            "updated_at": chat.updated_at,
-            "messages": message_outs
-        }
+        return chat_to_dict(chat, messages)
     except HTTPException:
         raise
     except Exception as e:
@@ -367,6 +338,38 @@ async def rename_chat_endpoint(
         raise HTTPException(status_code=500, detail=f"Failed to rename chat: {str(e)}")
 
 
+@app.get("/api/export")
+async def export_endpoint():
+    """Stream all personas, chats and messages as NDJSON"""
+    return StreamingResponse(
+        iter_export_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="openllmweb-export.ndjson"'},
+    )
+
+
+@app.post("/api/import")
+async def import_endpoint(request: Request, session: Session = Depends(get_session)):
+    """Import personas, chats and messages from an NDJSON export"""
+    try:
+        counts = await import_ndjson(session, request.stream())
+        return {"message": "Import completed successfully", **counts}
+    except (TransferError, ImportAbortedError) as e:
+        logger.error(f"Failed to import data: {str(e)}")
+        # Earlier batches stay committed; report them so a retry does not duplicate rows
+        raise HTTPException(
+            status_code=400 if isinstance(e, TransferError) else 500,
+            detail={
+                "message": f"Failed to import data: {str(e)}",
+                "line": e.line_number,
+                "committed": e.committed,
+            },
+        )
+    except Exception as e:
+        logger.error(f"Failed to import data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to import data: {str(e)}")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Column, JSON, Relationship
+from sqlalchemy import Index
 
 if TYPE_CHECKING:
     pass
@@ -25,10 +26,13 @@ class Chat(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 
 class ChatMessage(SQLModel, table=True):
+    # Covers history and context lookups, which filter by chat and sort by time
+    __table_args__ = (Index("ix_chatmessage_chat_id_created_at", "chat_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     chat_id: int = Field(foreign_key="chat.id")
     role: str = Field(index=True)  # 'system', 'user', 'assistant'
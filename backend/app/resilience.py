@@ -0,0 +1,182 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Status codes that mean the upstream is unhealthy rather than the request being wrong
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"LM Studio at {name} is unavailable; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """True for errors that indicate LM Studio itself is down or overloaded"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures.
+
+    closed: calls pass through; consecutive failures are counted.
+    open: calls are rejected until recovery_timeout has elapsed.
+    half_open: a single probe is let through; success closes the circuit,
+    failure opens it again. If a probe callable is given it is used as the
+    probe, so a slow call (such as a long completion) never holds the probe
+    slot; otherwise the first call after the timeout is the probe.
+
+    State is per process, so each worker tracks LM Studio independently.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        probe: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._retry_after() <= 0:
+            return self.HALF_OPEN
+        return self._state
+
+    def _retry_after(self) -> float:
+        return self._opened_at + self.recovery_timeout - time.monotonic()
+
+    def _before_call(self) -> bool:
+        """Admit or reject a call; True if the caller holds the probe slot"""
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            logger.info(f"Circuit for {self.name} half-open, sending probe")
+            return True
+        raise CircuitOpenError(self.name, max(self._retry_after(), 1.0))
+
+    def _record(self, exc: Exception) -> None:
+        if is_upstream_failure(exc):
+            self.record_failure(exc)
+        else:
+            # The upstream answered, so it is reachable
+            self.record_success()
+
+    async def _run_probe(self) -> None:
+        try:
+            await self.probe()
+        except Exception as e:
+            self._record(e)
+            if self.state != self.CLOSED:
+                raise CircuitOpenError(self.name, self.recovery_timeout) from e
+            return
+        except BaseException:
+            self._probe_in_flight = False
+            raise
+        self.record_success()
+
+    def record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, exc: BaseException) -> None:
+        self.last_error = str(exc) or exc.__class__.__name__
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} failures: {self.last_error}")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Run the enclosed block as one call through the breaker"""
+        if self._before_call() and self.probe is not None:
+            # Probe with the cheap call; the real call then runs closed
+            await self._run_probe()
+        try:
+            yield
+        except Exception as e:
+            self._record(e)
+            raise
+        except BaseException:
+            # Cancelled mid-call: let another caller probe
+            self._probe_in_flight = False
+            raise
+        self.record_success()
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        async with self.guard():
+            return await func()
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            "name": self.name,
+            "state": state,
+            "consecutive_failures": self._failures,
+            "retry_after": round(max(self._retry_after(), 0.0), 1) if state == self.OPEN else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+async def retry_with_jitter(
+    func: Callable[[], Awaitable[T]],
+    attempts: int = 3,
+    base_delay: float = 0.25,
+    max_delay: float = 2.0,
+) -> T:
+    """Retry func on transient upstream errors with full-jitter exponential backoff.
+
+    Only use for idempotent calls.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt == attempts or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logger.info(f"Retrying after error ({e}); attempt {attempt + 1}/{attempts} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
@@ -1,10 +1,35 @@
 from sqlmodel import Session, select
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
 from app.models import Setting
 
 DEFAULT_URL = "http://192.168.4.70:1234/v1"
 DEFAULT_CONTEXT_COUNT = 5
 
 
+def _upsert_setting(session: Session, key: str, value: str) -> None:
+    """Insert or update a setting atomically so concurrent writers cannot collide"""
+    now = datetime.utcnow()
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(Setting).values(key=key, value=value, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+        )
+        session.execute(stmt)
+        return
+
+    row = session.get(Setting, key)
+    if row:
+        row.value = value
+        row.updated_at = now
+    else:
+        row = Setting(key=key, value=value, updated_at=now)
+    session.add(row)
+
+
 def get_lm_studio_base_url(session: Session) -> str:
     stmt = select(Setting).where(Setting.key == "lm_studio_base_url")
     row = session.exec(stmt).first()
@@ -13,13 +38,7 @@ def get_lm_studio_base_url(session: Session) -> str:
 
 def set_lm_studio_base_url(session: Session, url: str) -> None:
     try:
-        stmt = select(Setting).where(Setting.key == "lm_studio_base_url")
-        row = session.exec(stmt).first()
-        if row:
-            row.value = url
-        else:
-            row = Setting(key="lm_studio_base_url", value=url)
-            session.add(row)
+        _upsert_setting(session, "lm_studio_base_url", url)
         session.commit()
         print(f"Successfully saved LM Studio URL: {url}")
     except Exception as e:
@@ -41,13 +60,7 @@ def get_context_message_count(session: Session) -> int:
 
 def set_context_message_count(session: Session, count: int) -> None:
     try:
-        stmt = select(Setting).where(Setting.key == "context_message_count")
-        row = session.exec(stmt).first()
-        if row:
-            row.value = str(count)
-        else:
-            row = Setting(key="context_message_count", value=str(count))
-            session.add(row)
+        _upsert_setting(session, "context_message_count", str(count))
         session.commit()
         print(f"Successfully saved context message count: {count}")
     except Exception as e:
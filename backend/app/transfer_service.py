@@ -0,0 +1,209 @@
+from sqlmodel import Session, select
+from typing import AsyncIterator, Dict, Iterator, Optional
+from datetime import datetime
+import json
+import logging
+
+from app.db import engine
+from app.models import Persona, Chat, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Rows read per short query during export
+EXPORT_BATCH_SIZE = 500
+# Rows written per transaction during import
+IMPORT_BATCH_SIZE = 500
+
+
+class TransferError(ValueError):
+    """Raised when an NDJSON import line cannot be understood"""
+
+    def __init__(self, line_number: int, message: str):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+        # Rows already committed by earlier batches; filled in by import_ndjson
+        self.committed: Dict[str, int] = {}
+
+
+class ImportAbortedError(RuntimeError):
+    """Raised when an import stops on an unexpected error, e.g. a database failure"""
+
+    def __init__(self, line_number: int, message: str, committed: Dict[str, int]):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+        self.committed = committed
+
+
+def _dt(value: datetime) -> str:
+    return value.isoformat()
+
+
+def _parse_dt(value: Optional[str]) -> datetime:
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+def _line(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _iter_keyset(model, batch_size: int) -> Iterator:
+    """Yield every row of a table in id order, one short read per batch.
+
+    Each batch uses its own session, so no cursor or read transaction stays
+    open between batches and writers are never blocked for the whole export.
+    """
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            statement = select(model).where(model.id > last_id).order_by(model.id).limit(batch_size)
+            rows = session.exec(statement).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def iter_export_lines(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Yield personas, chats and messages as NDJSON lines.
+
+    Tables are read in keyset-paginated batches, so memory stays flat and
+    concurrent writes can proceed while the export is being streamed.
+    """
+    for persona in _iter_keyset(Persona, batch_size):
+        yield _line({
+            "type": "persona",
+            "id": persona.id,
+            "name": persona.name,
+            "system_prompt": persona.system_prompt,
+            "created_at": _dt(persona.created_at),
+            "updated_at": _dt(persona.updated_at),
+        })
+
+    for chat in _iter_keyset(Chat, batch_size):
+        yield _line({
+            "type": "chat",
+            "id": chat.id,
+            "name": chat.name,
+            "created_at": _dt(chat.created_at),
+            "updated_at": _dt(chat.updated_at),
+        })
+
+    # All chats precede their messages, which is all the importer needs
+    for message in _iter_keyset(ChatMessage, batch_size):
+        yield _line({
+            "type": "message",
+            "id": message.id,
+            "chat_id": message.chat_id,
+            "role": message.role,
+            "content": message.content,
+            "created_at": _dt(message.created_at),
+        })
+    logger.info("Export stream completed")
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering the whole body"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def import_ndjson(
+    session: Session,
+    chunks: AsyncIterator[bytes],
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """Import NDJSON produced by iter_export_lines.
+
+    Records get fresh IDs; message chat_ids are remapped to the imported chats.
+    Rows are committed every batch_size records, so a failure part-way through
+    leaves the earlier batches in place; the raised error carries the
+    committed counts so the caller knows how much was written.
+    """
+    counts = {"personas": 0, "chats": 0, "messages": 0}
+    committed = dict(counts)
+    chat_id_map: Dict[int, int] = {}
+    pending_chats: Dict[int, Chat] = {}
+    pending = 0
+
+    def flush_batch():
+        nonlocal pending
+        if pending_chats:
+            session.flush()
+            for old_id, chat in pending_chats.items():
+                chat_id_map[old_id] = chat.id
+            pending_chats.clear()
+        session.commit()
+        session.expunge_all()
+        committed.update(counts)
+        pending = 0
+
+    line_number = 0
+    try:
+        async for raw in _iter_lines(chunks):
+            line_number += 1
+            if not raw.strip():
+                continue
+            try:
+                # UnicodeDecodeError is a ValueError, so bad bytes are reported per line
+                record = json.loads(raw.decode("utf-8"))
+                kind = record["type"]
+                if kind == "persona":
+                    session.add(Persona(
+                        name=record["name"],
+                        system_prompt=record["system_prompt"],
+                        created_at=_parse_dt(record.get("created_at")),
+                        updated_at=_parse_dt(record.get("updated_at")),
+                    ))
+                    counts["personas"] += 1
+                elif kind == "chat":
+                    chat = Chat(
+                        name=record["name"],
+                        created_at=_parse_dt(record.get("created_at")),
+                        updated_at=_parse_dt(record.get("updated_at")),
+                    )
+                    session.add(chat)
+                    pending_chats[record["id"]] = chat
+                    counts["chats"] += 1
+                elif kind == "message":
+                    if record["chat_id"] in pending_chats:
+                        flush_batch()
+                    new_chat_id = chat_id_map.get(record["chat_id"])
+                    if new_chat_id is None:
+                        raise TransferError(line_number, f"unknown chat_id {record['chat_id']}")
+                    session.add(ChatMessage(
+                        chat_id=new_chat_id,
+                        role=record["role"],
+                        content=record["content"],
+                        created_at=_parse_dt(record.get("created_at")),
+                    ))
+                    counts["messages"] += 1
+                else:
+                    raise TransferError(line_number, f"unknown record type {kind!r}")
+            except TransferError:
+                raise
+            except (ValueError, KeyError, TypeError) as e:
+                raise TransferError(line_number, f"invalid record: {e}") from e
+
+            pending += 1
+            if pending >= batch_size:
+                flush_batch()
+        flush_batch()
+    except TransferError as e:
+        session.rollback()
+        e.committed = dict(committed)
+        raise
+    except Exception as e:
+        session.rollback()
+        raise ImportAbortedError(line_number, str(e), dict(committed)) from e
+
+    logger.info(
+        f"Imported {counts['personas']} personas, {counts['chats']} chats, "
+        f"{counts['messages']} messages"
+    )
+    return counts
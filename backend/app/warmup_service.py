@@ -0,0 +1,177 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlmodel import Session
+import asyncio
+import logging
+import os
+import time
+
+from app.db import engine
+from app.lmstudio_client import LMStudioClient, CHAT_READ_TIMEOUT_MAX
+from app.settings_service import get_lm_studio_base_url
+
+logger = logging.getLogger(__name__)
+
+# A model counts as recently used if it answered a request or warm-up within this many seconds
+RECENTLY_USED_TTL = float(os.getenv("MODEL_RECENTLY_USED_TTL", "300"))
+# How often the keep-alive loop runs; keep this below LM Studio's idle unload TTL
+KEEPALIVE_INTERVAL = float(os.getenv("MODEL_KEEPALIVE_INTERVAL", "240"))
+# Models used within this window are kept resident
+KEEPALIVE_WINDOW = float(os.getenv("MODEL_KEEPALIVE_WINDOW", "1800"))
+# At most this many of the most recently used models are kept resident
+KEEPALIVE_MAX_MODELS = int(os.getenv("MODEL_KEEPALIVE_MAX_MODELS", "2"))
+# Read timeout for a warm-up; it covers the time LM Studio takes to load the model
+WARMUP_TIMEOUT = float(os.getenv("MODEL_WARMUP_TIMEOUT", str(CHAT_READ_TIMEOUT_MAX)))
+# Upper bound on tracked models; idle entries older than KEEPALIVE_WINDOW are dropped first
+MAX_TRACKED_MODELS = int(os.getenv("MODEL_MAX_TRACKED", "50"))
+
+# Smallest completion that still forces LM Studio to load the model
+WARMUP_PAYLOAD = {
+    "messages": [{"role": "user", "content": "hi"}],
+    "max_tokens": 1,
+    "temperature": 0,
+}
+
+
+class _ModelState:
+    def __init__(self):
+        self.last_touched = time.monotonic()
+        self.last_used: Optional[float] = None
+        self.last_ready: Optional[float] = None
+        self.last_warmup_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class ModelWarmup:
+    """Tracks which models this process has used and keeps favorites loaded.
+
+    The status is derived from local timestamps only; LM Studio may have
+    unloaded a "recently_used" model in the meantime. State is per process;
+    in multi-worker deployments each worker warms the models it has served.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str], _ModelState] = {}
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    def _state(self, base_url: str, model: str) -> _ModelState:
+        """Get or create the state for a model, marking it as recently touched"""
+        key = (base_url.rstrip("/"), model)
+        state = self._models.get(key)
+        if state is None:
+            self._prune(room=1)
+            state = self._models[key] = _ModelState()
+        state.last_touched = time.monotonic()
+        return state
+
+    def _prune(self, room: int = 0) -> None:
+        """Drop idle entries so arbitrary model IDs cannot grow the table forever.
+
+        room is the number of entries about to be added.
+        """
+        now = time.monotonic()
+        # Entries with a warm-up in flight are never dropped
+        removable = sorted(
+            (key for key, state in self._models.items() if state.task is None or state.task.done()),
+            key=lambda k: self._models[k].last_touched,
+        )
+        excess = len(self._models) + room - MAX_TRACKED_MODELS
+        for index, key in enumerate(removable):
+            if index < excess or now - self._models[key].last_touched >= KEEPALIVE_WINDOW:
+                del self._models[key]
+
+    def record_use(self, base_url: str, model: str) -> None:
+        """Note that a model just answered a real request"""
+        state = self._state(base_url, model)
+        now = time.monotonic()
+        state.last_used = now
+        state.last_ready = now
+        state.last_error = None
+
+    async def _warm(self, base_url: str, model: str, state: _ModelState) -> None:
+        started = time.monotonic()
+        try:
+            await LMStudioClient(base_url).load_model({"model": model, **WARMUP_PAYLOAD}, WARMUP_TIMEOUT)
+            state.last_ready = time.monotonic()
+            state.last_warmup_seconds = round(state.last_ready - started, 2)
+            state.last_error = None
+            logger.info(f"Warmed model {model} in {state.last_warmup_seconds}s")
+        except Exception as e:
+            state.last_error = str(e) or e.__class__.__name__
+            logger.warning(f"Failed to warm model {model}: {state.last_error}")
+
+    def warm(self, base_url: str, model: str) -> asyncio.Task:
+        """Start warming a model, reusing an in-flight warm-up for the same model"""
+        state = self._state(base_url, model)
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._warm(base_url, model, state))
+        return state.task
+
+    def status(self, base_url: str, model: str) -> Dict[str, Any]:
+        # Read-only: asking about a model must not start tracking it
+        state = self._models.get((base_url.rstrip("/"), model)) or _ModelState()
+        now = time.monotonic()
+        if state.task is not None and not state.task.done():
+            status = "warming"
+        elif state.last_ready is not None and now - state.last_ready < RECENTLY_USED_TTL:
+            status = "recently_used"
+        else:
+            status = "idle"
+        return {
+            "model": model,
+            "status": status,
+            "seconds_since_used": round(now - state.last_used, 1) if state.last_used else None,
+            "last_warmup_seconds": state.last_warmup_seconds,
+            "last_error": state.last_error,
+        }
+
+    def list_status(self, base_url: str) -> List[Dict[str, Any]]:
+        base_url = base_url.rstrip("/")
+        self._prune()
+        return [self.status(url, model) for url, model in self._models if url == base_url]
+
+    def keepalive_candidates(self, base_url: str) -> List[str]:
+        """Most recently used models that are due a keep-alive ping"""
+        base_url = base_url.rstrip("/")
+        now = time.monotonic()
+        recent = sorted(
+            (
+                (state.last_used, model)
+                for (url, model), state in self._models.items()
+                if url == base_url and state.last_used and now - state.last_used < KEEPALIVE_WINDOW
+            ),
+            reverse=True,
+        )[:KEEPALIVE_MAX_MODELS]
+        due = []
+        for _, model in recent:
+            state = self._models[(base_url, model)]
+            if state.last_ready is None or now - state.last_ready >= KEEPALIVE_INTERVAL:
+                due.append(model)
+        return due
+
+    async def _keepalive_loop(self) -> None:
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                with Session(engine) as session:
+                    base_url = get_lm_studio_base_url(session)
+                models = self.keepalive_candidates(base_url)
+                if models:
+                    await asyncio.gather(*(self.warm(base_url, model) for model in models))
+            except Exception as e:
+                logger.warning(f"Model keep-alive failed: {e}")
+
+    def start(self) -> None:
+        if KEEPALIVE_INTERVAL > 0 and self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+
+    async def stop(self) -> None:
+        tasks = [self._keepalive_task] if self._keepalive_task else []
+        tasks += [s.task for s in self._models.values() if s.task and not s.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._keepalive_task = None
+
+
+model_warmup = ModelWarmup()
@@ -0,0 +1,209 @@
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlmodel import Session
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+
+from app.db import engine
+from app.models import Chat, ChatMessage
+from app.schemas import ChatIn
+from app.settings_service import get_lm_studio_base_url
+from app.chat_service import prepare_chat_turn, save_chat_turn, chat_to_dict, message_to_dict
+from app.lmstudio_client import LMStudioClient
+from app.resilience import CircuitOpenError
+from app.warmup_service import model_warmup
+
+logger = logging.getLogger(__name__)
+
+# Frames queued per connection before history pushes to it are dropped
+OUTBOX_SIZE = 256
+
+
+class ChatConnection:
+    """One WebSocket carrying any number of concurrent chat streams.
+
+    Client messages:
+      {"type": "chat", "ref": <optional client tag>, ...ChatIn fields}
+      {"type": "cancel", "chat_id": <id>}
+
+    Server messages, all tagged with chat_id once it is known:
+      start, token, done, cancelled, error, history
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        # Every frame goes through one writer task, so a slow client only
+        # ever slows down its own streams
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self._writer: Optional[asyncio.Task] = None
+        self._streams: Dict[int, asyncio.Task] = {}
+
+    async def _write(self) -> None:
+        while True:
+            message = await self._outbox.get()
+            await self.websocket.send_json(message)
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """Queue a frame for this connection, waiting while the outbox is full"""
+        if self._writer is not None and self._writer.done():
+            # The socket is gone; the streams are about to be cancelled
+            return
+        await self._outbox.put(jsonable_encoder(message))
+
+    def push(self, message: Dict[str, Any]) -> bool:
+        """Queue a frame without waiting; False if the client is not keeping up"""
+        if self._writer is not None and self._writer.done():
+            return False
+        try:
+            self._outbox.put_nowait(jsonable_encoder(message))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def run(self) -> None:
+        self._writer = asyncio.create_task(self._write())
+        try:
+            while True:
+                raw = await self.websocket.receive_text()
+                try:
+                    message = json.loads(raw)
+                except ValueError as e:
+                    await self.send({"type": "error", "detail": f"Invalid JSON: {e}"})
+                    continue
+                kind = message.get("type") if isinstance(message, dict) else None
+                if kind == "chat":
+                    try:
+                        await self._start_chat(message)
+                    except Exception as e:
+                        # One failed turn must not take down the other streams
+                        logger.error(f"Failed to start chat: {str(e)}")
+                        await self.send({
+                            "type": "error",
+                            "ref": message.get("ref"),
+                            "chat_id": message.get("chat_id"),
+                            "detail": f"Failed to process chat request: {str(e)}",
+                        })
+                elif kind == "cancel":
+                    self._cancel(message.get("chat_id"))
+                else:
+                    await self.send({"type": "error", "detail": f"Unknown message type: {kind}"})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in self._streams.values():
+                task.cancel()
+            await asyncio.gather(*self._streams.values(), return_exceptions=True)
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    def _cancel(self, chat_id: Optional[int]) -> None:
+        task = self._streams.get(chat_id)
+        if task:
+            task.cancel()
+
+    async def _start_chat(self, message: Dict[str, Any]) -> None:
+        ref = message.get("ref")
+        try:
+            payload = ChatIn(**{k: v for k, v in message.items() if k not in ("type", "ref")})
+        except ValidationError as e:
+            await self.send({"type": "error", "ref": ref, "detail": str(e)})
+            return
+        if payload.chat_id in self._streams:
+            await self.send({
+                "type": "error",
+                "ref": ref,
+                "chat_id": payload.chat_id,
+                "detail": "A response is already streaming for this chat",
+            })
+            return
+
+        with Session(engine) as session:
+            try:
+                chat, chat_payload = prepare_chat_turn(session, payload)
+            except LookupError as e:
+                await self.send({"type": "error", "ref": ref, "chat_id": payload.chat_id, "detail": str(e)})
+                return
+            base_url = get_lm_studio_base_url(session)
+            chat_id = chat.id
+
+        await self.send({"type": "start", "ref": ref, "chat_id": chat_id})
+        task = asyncio.create_task(self._stream(chat_id, base_url, payload, chat_payload))
+        self._streams[chat_id] = task
+        task.add_done_callback(lambda _: self._streams.pop(chat_id, None))
+
+    async def _stream(
+        self, chat_id: int, base_url: str, payload: ChatIn, chat_payload: Dict[str, Any]
+    ) -> None:
+        client = LMStudioClient(base_url)
+        parts: List[str] = []
+        try:
+            async for delta in client.chat_stream(chat_payload):
+                parts.append(delta)
+                await self.send({"type": "token", "chat_id": chat_id, "content": delta})
+        except asyncio.CancelledError:
+            # Never wait here: on disconnect the socket is already gone
+            self.push({"type": "cancelled", "chat_id": chat_id})
+            # Keep whatever was generated so the conversation stays consistent
+            content = "".join(parts)
+            if content:
+                await self._save(chat_id, payload.prompt, content)
+            raise
+        except CircuitOpenError as e:
+            await self.send({"type": "error", "chat_id": chat_id, "detail": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Failed to stream chat {chat_id}: {str(e)}")
+            await self.send({
+                "type": "error",
+                "chat_id": chat_id,
+                "detail": f"Failed to process chat request: {str(e)}",
+            })
+            return
+
+        content = "".join(parts)
+        model_warmup.record_use(base_url, payload.model)
+        # Save before queueing done: with a full outbox the send can wait, and a
+        # cancel arriving then must not lose a complete reply
+        await self._save(chat_id, payload.prompt, content)
+        await self.send({"type": "done", "chat_id": chat_id, "content": content})
+
+    async def _save(self, chat_id: int, prompt: str, content: str) -> None:
+        with Session(engine) as session:
+            messages = save_chat_turn(session, chat_id, prompt, content)
+            chat = session.get(Chat, chat_id)
+            if chat:
+                broadcast_history(chat, messages)
+
+
+# Open connections in this process, for pushing history updates
+_connections: Set[ChatConnection] = set()
+
+
+def broadcast_history(chat: Chat, messages: List[ChatMessage]) -> None:
+    """Queue newly saved messages for every connected client.
+
+    Never waits on a socket, so a stalled client cannot delay the caller;
+    clients whose outbox is full miss the update.
+    """
+    update = {
+        "type": "history",
+        "chat_id": chat.id,
+        "chat": chat_to_dict(chat),
+        "messages": [message_to_dict(msg) for msg in messages],
+    }
+    for connection in list(_connections):
+        if not connection.push(update):
+            logger.warning(f"Dropped history update for chat {chat.id} to a slow WebSocket client")
+
+
+async def handle_websocket(websocket: WebSocket) -> None:
+    await websocket.accept()
+    connection = ChatConnection(websocket)
+    _connections.add(connection)
+    try:
+        await connection.run()
+    finally:
+        _connections.discard(connection)
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Keep tests off /app/data; must be set before app.db is imported
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="openllmweb-test-"))
+
+import pytest  # noqa: E402
+
+from app.db import init_db  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
@@ -0,0 +1,143 @@
+import httpx
+import pytest
+
+from app.lmstudio_client import chat_read_timeout
+from app.resilience import CircuitBreaker, CircuitOpenError, retry_with_jitter
+
+
+async def fail():
+    raise httpx.ConnectError("connection refused")
+
+
+async def ok():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_recovers_after_probe():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=0)
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            await breaker.call(fail)
+    assert breaker.snapshot()["consecutive_failures"] == 2
+
+    # recovery_timeout=0 means the next call is a half-open probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert await breaker.call(ok) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=60)
+    with pytest.raises(httpx.ConnectError):
+        await breaker.call(fail)
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(ok)
+    assert breaker.snapshot()["state"] == CircuitBreaker.OPEN
+
+
+@pytest.mark.asyncio
+async def test_retry_only_transient_errors():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("connection refused")
+        return "ok"
+
+    assert await retry_with_jitter(flaky, attempts=3, base_delay=0) == "ok"
+
+    async def bad_request():
+        calls.append(1)
+        request = httpx.Request("GET", "http://lmstudio/models")
+        raise httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400, request=request))
+
+    calls.clear()
+    with pytest.raises(httpx.HTTPStatusError):
+        await retry_with_jitter(bad_request, attempts=3, base_delay=0)
+    assert len(calls) == 1
+
+
+def test_chat_read_timeout_scales_with_max_tokens():
+    assert chat_read_timeout(2048) > chat_read_timeout(128)
+    assert chat_read_timeout(None) == chat_read_timeout(512)
+    assert chat_read_timeout(10_000_000) <= 600
+
+
+def test_lmstudio_status_endpoint():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    r = TestClient(app).get("/api/lmstudio/status")
+    assert r.status_code == 200
+    assert r.json()["state"] in ("closed", "open", "half_open")
+
+
+@pytest.mark.asyncio
+async def test_list_models_retries_count_as_one_breaker_failure(monkeypatch):
+    from app import resilience
+    from app.lmstudio_client import LMStudioClient
+
+    async def refuse(self, url, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(httpx.AsyncClient, "get", refuse)
+    monkeypatch.setattr(resilience.asyncio, "sleep", no_sleep)
+    client = LMStudioClient("http://retry-test:1234/v1")
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            await client.list_models()
+    assert client.breaker.snapshot()["consecutive_failures"] == 2
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_probe_does_not_wait_for_slow_call():
+    import asyncio
+
+    probes = []
+
+    async def probe():
+        probes.append(1)
+
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0, probe=probe)
+    with pytest.raises(httpx.ConnectError):
+        await breaker.call(fail)
+
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "slow"
+
+    slow_call = asyncio.create_task(breaker.call(slow))
+    await asyncio.sleep(0)
+    # The probe closed the circuit, so other calls are not rejected meanwhile
+    assert probes == [1]
+    assert await breaker.call(ok) == "ok"
+    release.set()
+    assert await slow_call == "slow"
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens_circuit():
+    async def probe():
+        raise httpx.ConnectError("still down")
+
+    called = []
+
+    async def call():
+        called.append(1)
+
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0, probe=probe)
+    with pytest.raises(httpx.ConnectError):
+        await breaker.call(fail)
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(call)
+    assert called == []
+    assert breaker._state == CircuitBreaker.OPEN
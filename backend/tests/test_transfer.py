@@ -0,0 +1,97 @@
+import json
+
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def test_export_import_roundtrip():
+    c = TestClient(app)
+    lines = [
+        {"type": "persona", "id": 1, "name": "Exported", "system_prompt": "Be brief."},
+        {"type": "chat", "id": 900001, "name": "Imported chat"},
+        {"type": "message", "id": 1, "chat_id": 900001, "role": "user", "content": "hi"},
+        {"type": "message", "id": 2, "chat_id": 900001, "role": "assistant", "content": "hello"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+    r = c.post("/api/import", content=body)
+    assert r.status_code == 200
+    assert r.json()["chats"] == 1
+    assert r.json()["messages"] == 2
+
+    r = c.get("/api/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in r.text.splitlines()]
+    assert any(rec["type"] == "chat" and rec["name"] == "Imported chat" for rec in records)
+    assert any(rec["type"] == "message" and rec["content"] == "hello" for rec in records)
+
+    for chat in c.get("/api/chats").json():
+        if chat["name"] == "Imported chat":
+            c.delete(f"/api/chats/{chat['id']}")
+    for persona in c.get("/api/personas").json():
+        if persona["name"] == "Exported":
+            c.delete(f"/api/personas/{persona['id']}")
+
+
+def test_import_rejects_unknown_chat():
+    c = TestClient(app)
+    body = json.dumps({"type": "message", "chat_id": -1, "role": "user", "content": "x"})
+    r = c.post("/api/import", content=body)
+    assert r.status_code == 400
+
+
+def test_writes_succeed_during_partial_export():
+    from sqlmodel import Session
+    from app.db import engine
+    from app.models import Chat
+    from app.transfer_service import iter_export_lines
+
+    with Session(engine) as session:
+        chats = [Chat(name=f"Export lock {i}") for i in range(3)]
+        session.add_all(chats)
+        session.commit()
+        chat_ids = [chat.id for chat in chats]
+
+    # Pause the export part-way through the chat table
+    lines = iter_export_lines(batch_size=1)
+    while '"type": "chat"' not in next(lines):
+        pass
+
+    with Session(engine) as session:
+        chat = Chat(name="Written during export")
+        session.add(chat)
+        session.commit()
+        chat_ids.append(chat.id)
+
+    assert any('"Written during export"' in line for line in lines)
+
+    c = TestClient(app)
+    for chat_id in chat_ids:
+        c.delete(f"/api/chats/{chat_id}")
+
+
+def test_import_rejects_invalid_utf8():
+    c = TestClient(app)
+    r = c.post("/api/import", content=b'{"type": "persona", "name": "\xff", "system_prompt": "x"}\n')
+    assert r.status_code == 400
+    assert "Line 1" in r.text
+
+
+def test_failed_import_reports_committed_rows():
+    c = TestClient(app)
+    lines = [
+        {"type": "chat", "id": 1, "name": "Partial import"},
+        {"type": "message", "chat_id": 1, "role": "user", "content": "kept"},
+        {"type": "message", "chat_id": 404, "role": "user", "content": "orphan"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+    r = c.post("/api/import", content=body)
+    assert r.status_code == 400
+    detail = r.json()["detail"]
+    assert detail["line"] == 3
+    # The chat was committed to resolve its messages' chat_id; the pending message was not
+    assert detail["committed"] == {"personas": 0, "chats": 1, "messages": 0}
+
+    for chat in c.get("/api/chats").json():
+        if chat["name"] == "Partial import":
+            c.delete(f"/api/chats/{chat['id']}")
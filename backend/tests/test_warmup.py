@@ -0,0 +1,113 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import warmup_service
+from app.lmstudio_client import LMStudioClient, BREAKER_FAILURE_THRESHOLD, get_breaker
+from app.warmup_service import ModelWarmup, KEEPALIVE_INTERVAL
+
+BASE_URL = "http://lmstudio:1234/v1"
+
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    payloads = []
+
+    async def load_model(self, payload, read_timeout):
+        payloads.append(payload)
+        return {"choices": [{"message": {"content": "."}}]}
+
+    monkeypatch.setattr(LMStudioClient, "load_model", load_model)
+    return payloads
+
+
+def test_record_use_marks_model_recently_used():
+    warmup = ModelWarmup()
+    warmup.record_use(BASE_URL + "/", "qwen")
+    assert warmup.status(BASE_URL, "qwen")["status"] == "recently_used"
+    assert warmup.status(BASE_URL, "llama")["status"] == "idle"
+    # Just used, so no keep-alive ping is due yet
+    assert warmup.keepalive_candidates(BASE_URL) == []
+
+
+def test_status_does_not_track_unknown_models():
+    warmup = ModelWarmup()
+    warmup.status(BASE_URL, "never-warmed")
+    assert warmup.list_status(BASE_URL) == []
+
+
+def test_tracked_models_are_capped(monkeypatch):
+    monkeypatch.setattr(warmup_service, "MAX_TRACKED_MODELS", 3)
+    warmup = ModelWarmup()
+    for i in range(10):
+        warmup.record_use(BASE_URL, f"model-{i}")
+    assert [m["model"] for m in warmup.list_status(BASE_URL)] == ["model-7", "model-8", "model-9"]
+
+
+@pytest.mark.asyncio
+async def test_warm_marks_model_recently_used(fake_chat):
+    warmup = ModelWarmup()
+    await warmup.warm(BASE_URL, "qwen")
+    status = warmup.status(BASE_URL, "qwen")
+    assert status["status"] == "recently_used"
+    assert status["last_warmup_seconds"] is not None
+    assert fake_chat[0]["model"] == "qwen"
+    assert fake_chat[0]["max_tokens"] == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_timeout_does_not_trip_breaker(monkeypatch):
+    timeouts = []
+
+    async def post(self, url, **kwargs):
+        timeouts.append(self.timeout.read)
+        raise httpx.ReadTimeout("timed out")
+
+    monkeypatch.setattr(httpx.AsyncClient, "post", post)
+    url = "http://slow-lmstudio:1234/v1"
+    warmup = ModelWarmup()
+    for _ in range(BREAKER_FAILURE_THRESHOLD + 1):
+        await warmup.warm(url, "big-model")
+
+    assert timeouts[0] == warmup_service.WARMUP_TIMEOUT
+    status = warmup.status(url, "big-model")
+    assert status["status"] == "idle"
+    assert status["last_error"] == "timed out"
+    # A slow model load says nothing about LM Studio's health
+    snapshot = get_breaker(url).snapshot()
+    assert snapshot["state"] == "closed"
+    assert snapshot["consecutive_failures"] == 0
+
+
+def test_keepalive_candidates_after_interval():
+    warmup = ModelWarmup()
+    for model in ["old", "recent", "newest"]:
+        warmup.record_use(BASE_URL, model)
+    for model in ["old", "recent", "newest"]:
+        warmup._models[(BASE_URL, model)].last_ready -= KEEPALIVE_INTERVAL + 1
+    # Only the most recently used models are kept resident
+    assert warmup.keepalive_candidates(BASE_URL) == ["newest", "recent"]
+
+
+def test_warm_endpoint_accepts_model_ids_with_slashes(fake_chat):
+    with TestClient(app) as c:
+        r = c.post("/api/models/lmstudio-community/qwen2.5-7b-instruct/warm")
+        assert r.status_code == 202
+        assert r.json()["model"] == "lmstudio-community/qwen2.5-7b-instruct"
+        assert r.json()["status"] in ("warming", "recently_used")
+
+        models = c.get("/api/models/status").json()
+        assert any(m["model"] == "lmstudio-community/qwen2.5-7b-instruct" for m in models)
+
+
+def test_warm_endpoint_warms_recently_used_models(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(warmup_service.model_warmup, "warm", lambda url, model: warmed.append(model))
+    with TestClient(app) as c:
+        base_url = c.get("/api/settings").json()["lm_studio_base_url"]
+        warmup_service.model_warmup.record_use(base_url, "qwen")
+        r = c.post("/api/models/qwen/warm")
+        assert r.status_code == 202
+        assert r.json()["status"] == "recently_used"
+    # Local timestamps cannot tell whether LM Studio still has the model loaded
+    assert warmed == ["qwen"]
@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.lmstudio_client import LMStudioClient
+
+
+async def fake_stream(self, payload):
+    for token in ["Hel", "lo"]:
+        yield token
+
+
+async def slow_stream(self, payload):
+    yield "partial"
+    await asyncio.sleep(30)
+    yield "never sent"
+
+
+def receive_until(ws, kind):
+    messages = []
+    while True:
+        message = ws.receive_json()
+        messages.append(message)
+        if message["type"] == kind:
+            return messages
+
+
+def test_ws_streams_tokens_and_pushes_history(monkeypatch):
+    monkeypatch.setattr(LMStudioClient, "chat_stream", fake_stream)
+    with TestClient(app) as c, c.websocket_connect("/api/ws") as ws:
+        ws.send_json({"type": "chat", "ref": "a", "model": "test", "prompt": "Say hello"})
+        start = ws.receive_json()
+        assert start["type"] == "start" and start["ref"] == "a"
+        chat_id = start["chat_id"]
+
+        messages = receive_until(ws, "done")
+        assert [m["content"] for m in messages if m["type"] == "token"] == ["Hel", "lo"]
+        assert messages[-1] == {"type": "done", "chat_id": chat_id, "content": "Hello"}
+
+        # The reply is saved before done is sent
+        history = messages[-2]
+        assert history["type"] == "history" and history["chat_id"] == chat_id
+        assert [m["role"] for m in history["messages"]] == ["user", "assistant"]
+
+        saved = c.get(f"/api/chats/{chat_id}").json()
+        assert saved["messages"][-1]["content"] == "Hello"
+        c.delete(f"/api/chats/{chat_id}")
+
+
+def test_ws_cancel_keeps_partial_response(monkeypatch):
+    monkeypatch.setattr(LMStudioClient, "chat_stream", slow_stream)
+    with TestClient(app) as c, c.websocket_connect("/api/ws") as ws:
+        ws.send_json({"type": "chat", "model": "test", "prompt": "Take your time"})
+        chat_id = ws.receive_json()["chat_id"]
+        assert ws.receive_json() == {"type": "token", "chat_id": chat_id, "content": "partial"}
+
+        ws.send_json({"type": "cancel", "chat_id": chat_id})
+        assert ws.receive_json() == {"type": "cancelled", "chat_id": chat_id}
+        assert ws.receive_json()["type"] == "history"
+
+        saved = c.get(f"/api/chats/{chat_id}").json()
+        assert saved["messages"][-1]["content"] == "partial"
+        c.delete(f"/api/chats/{chat_id}")
+
+
+def test_ws_reports_unknown_chat():
+    with TestClient(app) as c, c.websocket_connect("/api/ws") as ws:
+        ws.send_json({"type": "chat", "model": "test", "prompt": "hi", "chat_id": 999999})
+        message = ws.receive_json()
+        assert message["type"] == "error"
+        assert message["chat_id"] == 999999
+
+
+async def two_part_stream(self, payload):
+    yield "first"
+    await asyncio.sleep(0.2)
+    yield "second"
+
+
+def test_ws_bad_frame_keeps_streams_running(monkeypatch):
+    monkeypatch.setattr(LMStudioClient, "chat_stream", two_part_stream)
+    with TestClient(app) as c, c.websocket_connect("/api/ws") as ws:
+        ws.send_json({"type": "chat", "model": "test", "prompt": "Two parts"})
+        chat_id = ws.receive_json()["chat_id"]
+        assert ws.receive_json()["content"] == "first"
+
+        ws.send_text("{not json")
+        error = ws.receive_json()
+        assert error["type"] == "error" and "Invalid JSON" in error["detail"]
+
+        messages = receive_until(ws, "done")
+        assert messages[-1] == {"type": "done", "chat_id": chat_id, "content": "firstsecond"}
+        c.delete(f"/api/chats/{chat_id}")
+
+
+def test_ws_start_failure_reports_error(monkeypatch):
+    from app import ws_service
+
+    def broken(session, payload):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(ws_service, "prepare_chat_turn", broken)
+    with TestClient(app) as c, c.websocket_connect("/api/ws") as ws:
+        ws.send_json({"type": "chat", "ref": "x", "model": "test", "prompt": "hi"})
+        error = ws.receive_json()
+        assert error["type"] == "error" and error["ref"] == "x"
+        # The connection is still usable
+        ws.send_json({"type": "bogus"})
+        assert ws.receive_json()["type"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_broadcast_does_not_wait_on_stalled_client():
+    from datetime import datetime
+    from app import ws_service
+    from app.models import Chat
+
+    class StalledSocket:
+        async def send_json(self, message):
+            await asyncio.Event().wait()
+
+    connection = ws_service.ChatConnection(StalledSocket())
+    connection._writer = asyncio.create_task(connection._write())
+    ws_service._connections.add(connection)
+    try:
+        chat = Chat(id=1, name="Stalled", created_at=datetime.utcnow(), updated_at=datetime.utcnow())
+        for _ in range(ws_service.OUTBOX_SIZE + 10):
+            ws_service.broadcast_history(chat, [])
+        assert connection._outbox.full()
+    finally:
+        ws_service._connections.discard(connection)
+        connection._writer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_cancel_with_full_outbox_keeps_complete_reply(monkeypatch):
+    from sqlmodel import Session
+    from app import ws_service
+    from app.chat_service import create_chat, get_chat_messages, delete_chat
+    from app.db import engine
+    from app.schemas import ChatIn
+
+    class StalledSocket:
+        async def send_json(self, message):
+            await asyncio.Event().wait()
+
+    async def one_token_stream(self, payload):
+        yield "complete"
+
+    monkeypatch.setattr(LMStudioClient, "chat_stream", one_token_stream)
+    with Session(engine) as session:
+        chat_id = create_chat(session, "Full outbox").id
+
+    connection = ws_service.ChatConnection(StalledSocket())
+    connection._writer = asyncio.create_task(connection._write())
+    # The writer takes one frame and stalls; the token then fills the outbox,
+    # so queueing done has to wait
+    connection.push({"type": "filler"})
+    await asyncio.sleep(0)
+    for _ in range(ws_service.OUTBOX_SIZE - 1):
+        connection.push({"type": "filler"})
+
+    payload = ChatIn(model="test", prompt="Finish this", chat_id=chat_id)
+    task = asyncio.create_task(connection._stream(chat_id, "http://lmstudio:1234/v1", payload, {}))
+    try:
+        await asyncio.sleep(0.05)
+        assert not task.done() and connection._outbox.full()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        with Session(engine) as session:
+            messages = get_chat_messages(session, chat_id)
+            assert [(m.role, m.content) for m in messages] == [
+                ("user", "Finish this"),
+                ("assistant", "complete"),
+            ]
+    finally:
+        connection._writer.cancel()
+        with Session(engine) as session:
+            delete_chat(session, chat_id)
@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from 'react'
 import { Send, Loader2, Upload, X, FileText } from 'lucide-react'
-import { fetchModels, listPersonas, chat } from '../lib/api'
+import { fetchModels, listPersonas, chat, warmModel } from '../lib/api'
 import { readFile, isSupportedFileType, FileContent } from '../utils/fileReader'
 
 interface Model {
@@ -39,6 +39,14 @@ export default function QueryForm({ onResult, onError, currentChatId, onUserMess
     loadData()
   }, [])
 
+  // Ask the backend to load the model as soon as it is selected
+  useEffect(() => {
+    if (!selectedModel) return
+    warmModel(selectedModel).catch((error) => {
+      console.error('Failed to warm model:', error)
+    })
+  }, [selectedModel])
+
   const loadData = async () => {
     setIsLoadingModels(true)
     try {
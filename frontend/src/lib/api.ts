@@ -59,6 +59,10 @@ export async function refreshModels() {
   return (await api.post("/models/refresh")).data;
 }
 
+export async function warmModel(modelId: string) {
+  return (await api.post(`/models/${modelId.split("/").map(encodeURIComponent).join("/")}/warm`)).data;
+}
+
 // personas
 export async function listPersonas() {
   return (await api.get("/personas")).data;